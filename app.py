@@ -19,8 +19,10 @@ st.markdown("""
 @st.cache_resource
 def init_db():
     from models import seed_data
+    from series_store import get_store
     try:
         seed_data()
+        get_store() # warm the in-memory series store at startup (if enabled)
         return True
     except Exception as e:
         st.error(f"Failed to initialize database: {e}")
@@ -192,6 +194,39 @@ if page == "لوحة القيادة":
     else:
         st.warning("لا توجد بيانات للفترة المحددة.")
 
+    # --- Fleet Benchmark (all mosques, per worshipper capacity) ---
+    st.markdown("---")
+    st.subheader("🏆 مقارنة المساجد (لكل مصلٍ يومياً)")
+    from utils import get_fleet_benchmark
+    df_bench = get_fleet_benchmark(start_date=start_date, end_date=end_date)
+    if sel_utility and not df_bench.empty:
+        df_bench = df_bench[df_bench['type'].isin(sel_utility)]
+
+    if not df_bench.empty:
+        fig_bench = px.bar(
+            df_bench, x='name', y='consumption_per_capacity_day', color='type', barmode='group',
+            labels={'name': 'المسجد', 'consumption_per_capacity_day': 'الاستهلاك لكل مصلٍ يومياً', 'type': 'النوع'},
+            title="ترتيب المساجد حسب الاستهلاك المعياري"
+        )
+        st.plotly_chart(fig_bench, width="stretch")
+
+        bench_table = df_bench[[
+            'rank', 'name', 'type', 'capacity', 'consumption_per_capacity_day', 'cost_per_capacity_day', 'percentile'
+        ]].copy()
+        bench_table['percentile'] = (bench_table['percentile'] * 100).round(0)
+        st.dataframe(
+            bench_table.rename(columns={
+                'rank': 'الترتيب', 'name': 'المسجد', 'type': 'النوع', 'capacity': 'السعة',
+                'consumption_per_capacity_day': 'الاستهلاك/مصلٍ/يوم',
+                'cost_per_capacity_day': 'التكلفة/مصلٍ/يوم',
+                'percentile': 'المئين (%)'
+            }),
+            hide_index=True,
+            width="stretch"
+        )
+    else:
+        st.info("لا توجد بيانات كافية للمقارنة.")
+
 # 2. Prediction
 elif page == "التنبؤات":
     st.title("📈 التنبؤ بالاستهلاك الذكي")
@@ -236,6 +271,28 @@ elif page == "التنبؤات":
                 else:
                     st.warning("لا توجد بيانات كافية.")
 
+    # Fleet-wide forecast (all meters, parallel across CPU cores)
+    if user_role == 'admin':
+        st.markdown("---")
+        st.markdown("### 🏭 توقعات جميع العدادات")
+        from utils import run_fleet_forecast, get_fleet_forecast
+        if st.button("تحديث توقعات جميع العدادات"):
+            with st.spinner("جاري حساب التوقعات..."):
+                count = run_fleet_forecast()
+            st.success(f"تم حفظ {count} توقع")
+
+        df_fleet = get_fleet_forecast()
+        if not df_fleet.empty:
+            m_names = {m.id: m.name for m in mosques}
+            fleet_summary = df_fleet.groupby(['mosque_id', 'type'])['y'].mean().reset_index()
+            fleet_summary['mosque'] = fleet_summary['mosque_id'].map(m_names)
+            st.dataframe(
+                fleet_summary[['mosque', 'type', 'y']].rename(
+                    columns={'mosque': 'المسجد', 'type': 'النوع', 'y': 'متوسط الاستهلاك المتوقع'}
+                ),
+                width="stretch"
+            )
+
 elif page == "إدخال البيانات":
     st.title("📝 إدخال البيانات")
     
@@ -265,17 +322,17 @@ elif page == "إدخال البيانات":
                 with col2:
                     current_val = st.number_input("قراءة العداد الحالية (Cumulative)", min_value=0.0, step=1.0)
                 
-                # Auto-calculate cost (Optional helper)
-                unit_price = 0.18 if met_type == 'Electricity' else 5.0
+                # Unit price from the tariff table (base tier on the reading date)
+                from utils import get_unit_rate
+                unit_price = get_unit_rate(met_type, date_val)
                 st.caption(f"سعر الوحدة الافتراضي: {unit_price} ريال")
                 
                 submitted = st.form_submit_button("حفظ القراءة")
                 
                 if submitted:
                     from utils import add_reading
-                    # Estimate cost roughly based on this reading (in real app, diff with prev)
-                    # For POC, just passing 0 or simple calc if we had diff
-                    success = add_reading(met_id, date_val, current_val, cost=0) # Cost 0 for now as we calculate on diff
+                    # Cost is computed from the diff with the previous reading via the tariff table
+                    success = add_reading(met_id, date_val, current_val)
                     
                     if success:
                         st.success("✅ تم حفظ البيانات بنجاح!")
@@ -283,7 +340,7 @@ elif page == "إدخال البيانات":
 
     st.markdown("---")
     st.markdown("### 📤 استيراد ملف CSV")
-    uploaded_file = st.file_uploader("اختر ملف CSV (الأعمدة: meter_id, date, value, cost)", type="csv")
+    uploaded_file = st.file_uploader("اختر ملف CSV (الأعمدة: meter_id, date, value)", type="csv")
     if uploaded_file:
         from utils import process_csv_upload
         if st.button("معالجة الملف"):
@@ -297,8 +354,9 @@ elif page == "إدارة النظام":
     st.title("⚙️ إدارة النظام")
     
     from utils import create_mosque, delete_mosque, create_meter, delete_meter, create_user
+    from utils import get_tariffs, add_tariff, delete_tariff, recompute_all_costs
     
-    tab1, tab2, tab3 = st.tabs(["المساجد", "العدادات", "المستخدمين"])
+    tab1, tab2, tab3, tab4 = st.tabs(["المساجد", "العدادات", "المستخدمين", "التعرفة"])
     
     with tab1:
         st.header("إدارة المساجد")
@@ -362,3 +420,34 @@ elif page == "إدارة النظام":
                 else:
                     st.error("اسم المستخدم موجود مسبقاً")
 
+    with tab4:
+        st.header("إدارة التعرفة")
+        st.caption("يُحسب الاستهلاك اليومي كاملاً بسعر أعلى شريحة يتجاوزها. إضافة شريحة بتاريخ سريان جديد تنسخ بقية شرائح التعرفة السارية.")
+
+        tariffs = get_tariffs()
+        for t in tariffs.itertuples():
+            c1, c2 = st.columns([3, 1])
+            c1.write(f"{t.utility} - من {t.effective_from}: أكثر من {t.min_usage:,.0f} ← {t.rate} ريال")
+            if c2.button("حذف", key=f"del_t_{t.id}"):
+                if delete_tariff(t.id):
+                    st.rerun()
+                else:
+                    st.error("احذف الشرائح الأعلى لهذا الإصدار قبل الشريحة الأساسية")
+
+        st.markdown("---")
+        with st.form("add_tariff_form"):
+            new_t_utility = st.selectbox("نوع الخدمة", ["Electricity", "Water"])
+            new_t_from = st.date_input("تاريخ السريان", value=datetime.now())
+            new_t_min = st.number_input("بداية الشريحة (استهلاك يومي)", min_value=0.0, step=100.0)
+            new_t_rate = st.number_input("سعر الوحدة", min_value=0.0, step=0.01, format="%.2f")
+
+            if st.form_submit_button("إضافة شريحة"):
+                if add_tariff(new_t_utility, new_t_from, new_t_min, new_t_rate):
+                    st.success("تمت إضافة الشريحة وإعادة احتساب التكاليف")
+                    st.rerun()
+                else:
+                    st.error("يجب أن تبدأ أول شريحة لهذه الخدمة من صفر")
+
+        if st.button("إعادة احتساب جميع التكاليف"):
+            count = recompute_all_costs()
+            st.success(f"تم تحديث {count} قراءة")
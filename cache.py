@@ -0,0 +1,262 @@
+import functools
+import hashlib
+import io
+import json
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Result cache shared between Streamlit replicas and restarts.
+# st.cache_data only lives in one server process; functions wrapped with
+# @shared_cache also look in a backend every replica can reach. Enable it by
+# pointing MOSQUE_CACHE_DIR at a directory on a shared local disk.
+#
+# Invalidation uses a generation token stored next to the blobs: clear() moves
+# it on, and every key includes it, so results computed under an older
+# generation (even ones written after the clear by a slow replica) are never
+# read again. Callers with their own in-process cache should key on
+# get_backend().generation() too.
+
+CACHE_DIR_ENV = "MOSQUE_CACHE_DIR"
+CACHE_MAX_MB_ENV = "MOSQUE_CACHE_MAX_MB"
+CACHE_TTL_ENV = "MOSQUE_CACHE_TTL"
+
+DEFAULT_MAX_MB = 512
+DEFAULT_TTL = 3600 # seconds
+
+_MISS = object()
+
+# Blob layout: magic, 4-byte header length, JSON header, then Parquet frames.
+# Nothing read back from the shared directory is ever unpickled.
+_MAGIC = b'MCC1'
+
+
+def _encode(value, frames):
+    # DataFrames become Parquet blocks referenced by index; tuples are encoded
+    # element-wise so results like (df, avg, accuracy) keep frames compact.
+    # Anything else must be JSON-serializable.
+    if isinstance(value, pd.DataFrame):
+        buf = io.BytesIO()
+        value.to_parquet(buf)
+        frames.append(buf.getvalue())
+        return {'frame': len(frames) - 1}
+    if isinstance(value, tuple):
+        return {'tuple': [_encode(v, frames) for v in value]}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {'json': value}
+    raise TypeError(f"Cannot store {type(value).__name__} in the shared cache")
+
+
+def _decode(node, frames):
+    if 'frame' in node:
+        return pd.read_parquet(io.BytesIO(frames[node['frame']]))
+    if 'tuple' in node:
+        return tuple(_decode(v, frames) for v in node['tuple'])
+    return node['json']
+
+
+def dump_blob(value, expires_at):
+    frames = []
+    header = {'expires_at': expires_at, 'value': _encode(value, frames)}
+    header['frames'] = [len(f) for f in frames]
+    header_bytes = json.dumps(header).encode()
+    return b''.join([_MAGIC, struct.pack('>I', len(header_bytes)), header_bytes] + frames)
+
+
+def load_blob(data):
+    """Return (expires_at, value); raises ValueError on a malformed blob."""
+    if data[:4] != _MAGIC or len(data) < 8:
+        raise ValueError("Not a cache blob")
+    (header_len,) = struct.unpack('>I', data[4:8])
+    header = json.loads(data[8:8 + header_len])
+    frames = []
+    offset = 8 + header_len
+    for length in header['frames']:
+        frames.append(data[offset:offset + length])
+        offset += length
+    return header['expires_at'], _decode(header['value'], frames)
+
+
+class NullCache:
+    """Backend used when no shared cache is configured: always misses."""
+
+    def generation(self):
+        return '0'
+
+    def get(self, key):
+        return _MISS
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def clear(self):
+        pass
+
+
+class DiskCache:
+    """Size-bounded, TTL-aware cache of result blobs in a directory.
+
+    Writes go through a temp file and os.replace, so several processes can
+    share the directory. Hits refresh the file's mtime; when the directory
+    grows past max_bytes the least recently used blobs are evicted.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, default_ttl=DEFAULT_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.blob")
+
+    def _generation_path(self):
+        return os.path.join(self.directory, 'generation')
+
+    def generation(self):
+        try:
+            with open(self._generation_path()) as f:
+                return f.read().strip() or '0'
+        except OSError:
+            return '0'
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = load_blob(f.read())
+        except (OSError, ValueError, KeyError, IndexError):
+            return _MISS
+
+        if expires_at is not None and expires_at < time.time():
+            self._remove(path)
+            return _MISS
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        self._write(self._path(key), dump_blob(value, expires_at))
+        self._evict()
+
+    def clear(self):
+        # New token first: from here on no replica builds a key that matches an old blob.
+        # Any unique value works, so concurrent clears need no locking.
+        token = f"{time.time_ns()}-{os.getpid()}"
+        self._write(self._generation_path(), token.encode())
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    def _entries(self):
+        try:
+            return [e for e in os.scandir(self.directory) if e.name.endswith('.blob')]
+        except OSError:
+            return []
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                info = entry.stat()
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, entry.path))
+            total += info.st_size
+        if total <= self.max_bytes:
+            return
+
+        # Oldest first (mtime is refreshed on every hit)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        directory = os.environ.get(CACHE_DIR_ENV)
+        if directory:
+            max_mb = float(os.environ.get(CACHE_MAX_MB_ENV, DEFAULT_MAX_MB))
+            ttl = int(os.environ.get(CACHE_TTL_ENV, DEFAULT_TTL))
+            _backend = DiskCache(directory, max_bytes=int(max_mb * 1024 * 1024), default_ttl=ttl)
+        else:
+            _backend = NullCache()
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the backend (any object with generation/get/set/clear), e.g. for another store."""
+    global _backend
+    _backend = backend
+
+
+def make_key(func, args, kwargs, generation):
+    raw = repr((generation, func.__module__, func.__qualname__, args, sorted(kwargs.items())))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def shared_cache(ttl=None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            # Generation is read before computing, so a clear() during the call
+            # leaves this result under a key nobody will look up again
+            key = make_key(func, args, kwargs, backend.generation())
+            try:
+                value = backend.get(key)
+            except Exception:
+                value = _MISS
+            if value is not _MISS:
+                return value
+
+            value = func(*args, **kwargs)
+            try:
+                backend.set(key, value, ttl)
+            except Exception:
+                # A cache write failure must never break the request itself
+                pass
+            return value
+        return wrapper
+    return decorator
+
+
+def cache_generation():
+    return get_backend().generation()
+
+
+def clear_shared_cache():
+    get_backend().clear()
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import r2_score
+
+from models import DB_FILE, Session, Mosque, Meter, Forecast
+
+# Pool workers are started with forkserver (spawn on Windows) rather than fork: the runner is
+# launched from inside the multi-threaded Streamlit server, which must not be
+# forked along with its SQLAlchemy pool. Workers therefore re-import this
+# module, which is kept free of streamlit imports so they start quickly.
+
+FORECAST_DAYS = 30
+MIN_READINGS = 30
+
+
+def fit_trend(day_index, usage, horizon=FORECAST_DAYS):
+    """Fit a linear trend on daily usage and project it `horizon` days ahead.
+
+    Returns (future_day_index, predictions, r2 on the training data).
+    """
+    X = np.asarray(day_index, dtype=np.float64).reshape(-1, 1)
+    y = np.asarray(usage, dtype=np.float64)
+
+    model = LinearRegression()
+    model.fit(X, y)
+    accuracy = r2_score(y, model.predict(X))
+
+    last_day = int(X[-1, 0])
+    future_index = np.arange(last_day + 1, last_day + horizon + 1)
+    preds = model.predict(future_index.reshape(-1, 1).astype(np.float64))
+    return future_index, preds, accuracy
+
+
+def _open_readonly(db_file):
+    # Each worker gets its own connection; mode=ro keeps workers from ever taking a write lock
+    return sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+
+
+def _forecast_chunk(meter_ids, db_file, horizon):
+    conn = _open_readonly(db_file)
+    rows = []
+    try:
+        for meter_id in meter_ids:
+            cur = conn.execute(
+                "SELECT date, value FROM readings WHERE meter_id = ? ORDER BY date",
+                (meter_id,),
+            )
+            series = cur.fetchall()
+            if len(series) < MIN_READINGS:
+                continue
+
+            days = np.array([d for d, _ in series], dtype='datetime64[D]').astype(np.int64)
+            values = np.fromiter((v for _, v in series), dtype=np.float64, count=len(series))
+
+            # Same shape as predict_usage: daily deltas, first reading dropped
+            usage = np.diff(values)
+            future_index, preds, _ = fit_trend(days[1:], usage, horizon)
+
+            future_dates = future_index.astype('datetime64[D]').astype(object)
+            rows.extend(
+                {'meter_id': meter_id, 'date': d, 'value': float(p)}
+                for d, p in zip(future_dates, preds)
+            )
+    finally:
+        conn.close()
+    return rows
+
+
+def _partition(items, n):
+    # Round-robin so meters with long histories don't pile up in one chunk
+    return [chunk for chunk in (items[i::n] for i in range(n)) if chunk]
+
+
+def forecast_fleet(meter_ids=None, max_workers=None, horizon=FORECAST_DAYS):
+    """Refit every meter across a process pool and store the projections.
+
+    Existing forecasts for the refitted meters are replaced in one transaction.
+    Returns the number of forecast rows written.
+    """
+    session = Session()
+    try:
+        if meter_ids is None:
+            # Meters of deleted mosques are left behind (no cascade); skip them
+            meter_ids = [
+                m_id for (m_id,) in
+                session.query(Meter.id).join(Mosque, Meter.mosque_id == Mosque.id).order_by(Meter.id)
+            ]
+        meter_ids = list(meter_ids)
+        if not meter_ids:
+            return 0
+
+        workers = min(max_workers or os.cpu_count() or 1, len(meter_ids))
+        chunks = _partition(meter_ids, workers)
+
+        rows = []
+        if workers == 1:
+            rows = _forecast_chunk(meter_ids, DB_FILE, horizon)
+        else:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            mp_context = multiprocessing.get_context(start_method)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+                futures = [pool.submit(_forecast_chunk, chunk, DB_FILE, horizon) for chunk in chunks]
+                for fut in futures:
+                    rows.extend(fut.result())
+
+        session.query(Forecast).filter(Forecast.meter_id.in_(meter_ids)).delete(synchronize_session=False)
+        if rows:
+            session.execute(Forecast.__table__.insert(), rows)
+        session.commit()
+        return len(rows)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    print(f"Wrote {forecast_fleet()} forecast rows.")
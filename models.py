@@ -1,7 +1,7 @@
 import random
 import math
-from datetime import datetime, timedelta
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date, ForeignKey, Enum
+from datetime import datetime, timedelta, date
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, ForeignKey, Enum, Index, text
 import enum
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 
@@ -54,10 +54,69 @@ class Reading(Base):
     date = Column(Date)
     cost = Column(Float)
     meter = relationship("Meter", back_populates="readings")
+    # One reading per meter per day; the upsert in utils.upsert_readings relies on it
+    __table_args__ = (Index('ux_readings_meter_date', 'meter_id', 'date', unique=True),)
+
+class Forecast(Base):
+    __tablename__ = 'forecasts'
+    id = Column(Integer, primary_key=True)
+    meter_id = Column(Integer, ForeignKey('meters.id'), index=True)
+    date = Column(Date)
+    value = Column(Float) # predicted daily usage
+
+class Tariff(Base):
+    __tablename__ = 'tariffs'
+    id = Column(Integer, primary_key=True)
+    utility = Column(String, nullable=False) # Electricity / Water, matches Meter.type
+    effective_from = Column(Date, nullable=False)
+    min_usage = Column(Float, nullable=False, default=0.0) # daily usage above this uses `rate`
+    rate = Column(Float, nullable=False)
+
+# (utility, effective_from, min_usage, rate)
+DEFAULT_TARIFFS = [
+    ('Electricity', date(2000, 1, 1), 0.0, 0.18),
+    ('Electricity', date(2000, 1, 1), 6000.0, 0.30),
+    ('Water', date(2000, 1, 1), 0.0, 6.0),
+]
+
+def seed_tariffs(session):
+    if session.query(Tariff).count() > 0:
+        return
+    for utility, effective_from, min_usage, rate in DEFAULT_TARIFFS:
+        session.add(Tariff(utility=utility, effective_from=effective_from, min_usage=min_usage, rate=rate))
+    session.commit()
+
+def ensure_reading_index():
+    # Databases created before the unique index may hold duplicate (meter_id, date) rows.
+    # Keep the latest row of each pair, then add the index (create_all skips existing tables).
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_readings_meter_date'"
+        )).first()
+        if exists:
+            return
+        affected = [m_id for (m_id,) in conn.execute(text(
+            "SELECT DISTINCT meter_id FROM readings GROUP BY meter_id, date HAVING COUNT(*) > 1"
+        ))]
+        conn.execute(text(
+            "DELETE FROM readings WHERE id NOT IN "
+            "(SELECT MAX(id) FROM readings GROUP BY meter_id, date)"
+        ))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_readings_meter_date ON readings (meter_id, date)"
+        ))
+
+    if affected:
+        # Dropped rows change the deltas (and so the costs) of the readings after them
+        from tariffs import recompute_costs
+        recompute_costs(affected)
 
 def seed_data():
     Base.metadata.create_all(engine)
     session = Session()
+    seed_tariffs(session)
+    # After the tariffs, so repricing deduplicated meters has rates to use
+    ensure_reading_index()
     
     # Check if data exists
     if session.query(Mosque).count() > 0:
@@ -82,6 +141,9 @@ def seed_data():
     session.add(manager)
     session.flush()
     
+    from tariffs import compute_costs, daily_usage as reading_deltas, load_tariffs
+    tariffs = load_tariffs(session)
+    
     mosques_data = [
         ("Masjid Al-Nour", "Downtown", 1000),
         ("Masjid Al-Falah", "North", 500),
@@ -106,7 +168,9 @@ def seed_data():
             start_date = datetime.now().date() - timedelta(days=days_history)
             curr_val = 10000.0
             
-            readings = []
+            # Baseline reading the day before; like any first reading it costs nothing
+            dates = [start_date - timedelta(days=1)]
+            values = [curr_val]
             
             # Base load factors
             base_load = m_cap * (0.5 if m_type == 'Electricity' else 0.05)
@@ -135,21 +199,18 @@ def seed_data():
                 
                 curr_val += daily_usage
                 
-                # Pricing
-                rate = 0.18 if m_type == 'Electricity' else 6.0
-                if m_type == 'Electricity' and daily_usage > 6000: # Tiered pricing simulation
-                    rate = 0.30
-                
-                cost = daily_usage * rate
-                
-                readings.append(Reading(
-                    meter_id=meter.id,
-                    value=round(curr_val, 2),
-                    date=date_obj,
-                    cost=round(cost, 2)
-                ))
+                dates.append(date_obj)
+                values.append(round(curr_val, 2))
+            
+            # Pricing (tiered, from the tariff table), from the stored values the
+            # same way recompute_costs does, so repricing leaves the seed unchanged
+            usages = reading_deltas([meter.id] * len(values), values)
+            costs = compute_costs([m_type] * len(usages), dates, usages, tariffs)
             
-            session.add_all(readings)
+            session.add_all([
+                Reading(meter_id=meter.id, value=val, date=date_obj, cost=float(cost))
+                for date_obj, val, cost in zip(dates, values, costs)
+            ])
     
     session.commit()
     session.close()
@@ -0,0 +1,232 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from cache import cache_generation
+from models import engine
+
+# Optional in-memory copy of every meter's readings as contiguous NumPy arrays
+# (int32 day number, float64 cumulative value, float32 cost), kept sorted by day.
+# get_chart_data slices it instead of querying SQLite. Enable with
+# MOSQUE_SERIES_STORE=1; each Streamlit process holds its own copy, so its
+# results bypass the shared cache in cache.py. A full load records the shared
+# cache generation, and get_store reloads once another write has moved it on.
+
+SERIES_STORE_ENV = "MOSQUE_SERIES_STORE"
+
+
+def _to_days(dates):
+    return pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]').astype(np.int32)
+
+
+def _day(date_obj):
+    return int(np.datetime64(pd.Timestamp(date_obj).date(), 'D').astype(np.int64))
+
+
+class MeterSeries:
+    __slots__ = ('mosque_id', 'type', 'day', 'value', 'cost', 'size')
+
+    def __init__(self, mosque_id, meter_type, capacity=64):
+        self.mosque_id = mosque_id
+        self.type = meter_type
+        self.day = np.empty(capacity, dtype=np.int32)
+        self.value = np.empty(capacity, dtype=np.float64)
+        self.cost = np.empty(capacity, dtype=np.float32)
+        self.size = 0
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.day):
+            return
+        capacity = max(len(self.day) * 2, needed)
+        for name in ('day', 'value', 'cost'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def upsert(self, day, value, cost):
+        """Add rows sorted by day; a day already present takes the new row."""
+        n = len(day)
+        if n == 0:
+            return
+        if self.size == 0 or day[0] > self.day[self.size - 1]:
+            # Common case: readings newer than anything held, plain append
+            self._reserve(n)
+            end = self.size + n
+            self.day[self.size:end] = day
+            self.value[self.size:end] = value
+            self.cost[self.size:end] = cost
+            self.size = end
+            return
+
+        days = np.concatenate([self.day[:self.size], day])
+        values = np.concatenate([self.value[:self.size], value])
+        costs = np.concatenate([self.cost[:self.size], cost])
+        # Stable sort keeps new rows after old ones for the same day; keep the last of each run
+        order = np.argsort(days, kind='stable')
+        days, values, costs = days[order], values[order], costs[order]
+        keep = np.ones(len(days), dtype=bool)
+        keep[:-1] = days[1:] != days[:-1]
+
+        self.size = 0
+        self._reserve(int(keep.sum()))
+        self.size = int(keep.sum())
+        self.day[:self.size] = days[keep]
+        self.value[:self.size] = values[keep]
+        self.cost[:self.size] = costs[keep]
+
+    def window(self, start_day=None, end_day=None):
+        days = self.day[:self.size]
+        lo = 0 if start_day is None else np.searchsorted(days, start_day, side='left')
+        hi = self.size if end_day is None else np.searchsorted(days, end_day, side='right')
+        return lo, hi
+
+    @property
+    def nbytes(self):
+        return self.day.nbytes + self.value.nbytes + self.cost.nbytes
+
+
+class SeriesStore:
+    def __init__(self):
+        self.meters = {}
+        self.generation = None
+        self._lock = threading.Lock()
+
+    def load(self, meter_ids=None, start_date=None):
+        """Pull readings from SQLite into the arrays.
+
+        With no arguments the store is rebuilt from scratch; otherwise only the
+        given meters' readings on/after start_date are upserted.
+        """
+        full = meter_ids is None and start_date is None
+        # Read before querying, so a write landing during the load triggers another one
+        generation = cache_generation()
+        meta_sql = (
+            "SELECT mt.id, mt.mosque_id, mt.type FROM meters mt "
+            "JOIN mosques mo ON mo.id = mt.mosque_id"
+        )
+        sql = "SELECT meter_id, date, value, cost FROM readings WHERE 1 = 1"
+        params = {}
+        if meter_ids is not None:
+            meter_ids = [int(m) for m in meter_ids]
+            if not meter_ids:
+                return
+            placeholders = ", ".join(f":m{i}" for i in range(len(meter_ids)))
+            meta_sql += f" WHERE mt.id IN ({placeholders})"
+            sql += f" AND meter_id IN ({placeholders})"
+            params.update({f"m{i}": m for i, m in enumerate(meter_ids)})
+        if start_date is not None:
+            sql += " AND date >= :start_date"
+            params['start_date'] = pd.Timestamp(start_date).date().isoformat()
+        sql += " ORDER BY meter_id, date"
+
+        with engine.connect() as conn:
+            meta = conn.execute(text(meta_sql), params).fetchall()
+            df = pd.read_sql(text(sql), conn, params=params)
+
+        meter_ids_col = df['meter_id'].to_numpy()
+        days = _to_days(df['date'])
+        values = df['value'].to_numpy(dtype=np.float64)
+        costs = df['cost'].fillna(0).to_numpy(dtype=np.float32)
+        # Rows are ordered by meter, so each meter is one contiguous block
+        ids, starts = np.unique(meter_ids_col, return_index=True)
+        bounds = dict(zip(ids.tolist(), zip(starts.tolist(), list(starts[1:]) + [len(df)])))
+
+        with self._lock:
+            meters = {} if full else self.meters
+            for m_id, mosque_id, meter_type in meta:
+                series = meters.get(m_id)
+                if series is None or series.mosque_id != mosque_id:
+                    series = meters[m_id] = MeterSeries(mosque_id, meter_type)
+                if m_id in bounds:
+                    lo, hi = bounds[m_id]
+                    series.upsert(days[lo:hi], values[lo:hi], costs[lo:hi])
+            self.meters = meters
+            if full:
+                self.generation = generation
+
+    def drop(self, meter_ids=None, mosque_id=None):
+        with self._lock:
+            for m_id in list(self.meters):
+                if (meter_ids is not None and m_id in meter_ids) or \
+                        (mosque_id is not None and self.meters[m_id].mosque_id == mosque_id):
+                    del self.meters[m_id]
+
+    def frame(self, mosque_id=None, meter_type=None, start_date=None, end_date=None):
+        """Same columns and semantics as utils.get_chart_data."""
+        start_day = _day(start_date) if start_date else None
+        end_day = _day(end_date) if end_date else None
+
+        parts = []
+        with self._lock:
+            for m_id, series in self.meters.items():
+                if mosque_id and series.mosque_id != mosque_id:
+                    continue
+                if meter_type and series.type != meter_type:
+                    continue
+                lo, hi = series.window(start_day, end_day)
+                if hi > lo:
+                    # Copies, so later appends can't change a frame already handed out
+                    parts.append((m_id, series, series.day[lo:hi].copy(),
+                                  series.value[lo:hi].copy(), series.cost[lo:hi].copy()))
+        if not parts:
+            return pd.DataFrame()
+
+        lengths = np.array([len(p[2]) for p in parts])
+        days = np.concatenate([p[2] for p in parts])
+        values = np.concatenate([p[3] for p in parts])
+        costs = np.concatenate([p[4] for p in parts])
+        meter_ids = np.repeat([p[0] for p in parts], lengths)
+        mosque_ids = np.repeat([p[1].mosque_id for p in parts], lengths)
+        types = np.repeat(np.array([p[1].type for p in parts], dtype=object), lengths)
+
+        # Diff within each meter; the first reading of each block gets 0 like groupby().diff().fillna(0),
+        # and meter resets are clipped to 0 like the SQL path
+        daily = np.zeros(len(values), dtype=np.float64)
+        daily[1:] = np.clip(np.diff(values), 0, None)
+        daily[np.cumsum(lengths)[:-1]] = 0.0
+        daily[0] = 0.0
+
+        return pd.DataFrame({
+            'date': pd.to_datetime(days.astype('datetime64[D]')),
+            'value': values,
+            # float32 storage is only exact to ~7 digits; stored costs have 2 decimals
+            'cost': np.round(costs.astype(np.float64), 2),
+            'meter_id': meter_ids,
+            'mosque_id': mosque_ids,
+            'type': types,
+            'daily_consumption': daily,
+        })
+
+    @property
+    def nbytes(self):
+        return sum(s.nbytes for s in self.meters.values())
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide store, loaded on first use; None when disabled.
+
+    Rebuilt when the shared cache generation has changed since the last full
+    load, i.e. after a write on this or another replica.
+    """
+    global _store
+    if os.environ.get(SERIES_STORE_ENV, '').lower() not in ('1', 'true', 'yes'):
+        return None
+    generation = cache_generation()
+    if _store is None or _store.generation != generation:
+        with _store_lock:
+            if _store is None:
+                store = SeriesStore()
+                store.load()
+                _store = store
+            elif _store.generation != generation:
+                _store.load()
+    return _store
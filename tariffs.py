@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from models import Session, Tariff
+
+# Tier semantics follow the original seed pricing: the whole day's usage is
+# billed at the rate of the highest tier whose threshold it exceeds.
+# Thresholds are per day, so a reading covering several days is tiered on its
+# average daily usage and the whole delta is billed at that rate.
+# A tariff version is every tier of one utility sharing an effective_from date;
+# each version must have a base tier at min_usage 0 so every usage has a rate.
+
+TARIFF_COLUMNS = ['utility', 'effective_from', 'min_usage', 'rate']
+
+
+def tariffs_frame(rows):
+    df = pd.DataFrame(list(rows), columns=TARIFF_COLUMNS)
+    df['effective_from'] = pd.to_datetime(df['effective_from']).values.astype('datetime64[D]')
+    df['min_usage'] = df['min_usage'].astype(np.float64)
+    df['rate'] = df['rate'].astype(np.float64)
+    return df
+
+
+def load_tariffs(session):
+    rows = session.query(Tariff.utility, Tariff.effective_from, Tariff.min_usage, Tariff.rate).all()
+    return tariffs_frame(rows)
+
+
+def validate_tariffs(tariffs):
+    """Raise ValueError if any tariff version lacks a base tier at min_usage 0."""
+    base = tariffs['min_usage'] == 0
+    has_base = base.groupby([tariffs['utility'], tariffs['effective_from']]).any()
+    missing = has_base[~has_base]
+    if not missing.empty:
+        utility, effective_from = missing.index[0]
+        raise ValueError(
+            f"Tariff version {utility} from {pd.Timestamp(effective_from).date()} has no tier at min_usage 0"
+        )
+
+
+def add_tier(session, utility, effective_from, min_usage, rate):
+    """Add a tier, starting a new version from the one in force if needed.
+
+    A tier at a date with no version yet copies forward the other tiers of the
+    version in force on that date, so e.g. raising only the top tier keeps the
+    base tier. A tier matching an existing (utility, date, min_usage) just gets
+    the new rate. Raises ValueError if the result would lack a base tier.
+    The caller commits.
+    """
+    existing = session.query(Tariff).filter_by(utility=utility, effective_from=effective_from).all()
+    if not existing:
+        previous = session.query(Tariff.effective_from).filter(
+            Tariff.utility == utility, Tariff.effective_from < effective_from
+        ).order_by(Tariff.effective_from.desc()).first()
+        if previous is not None:
+            for tier in session.query(Tariff).filter_by(utility=utility, effective_from=previous[0]):
+                if tier.min_usage != min_usage:
+                    session.add(Tariff(utility=utility, effective_from=effective_from,
+                                       min_usage=tier.min_usage, rate=tier.rate))
+        elif min_usage != 0:
+            raise ValueError(f"The first {utility} tariff must start at min_usage 0")
+
+    same = next((t for t in existing if t.min_usage == min_usage), None)
+    if same is not None:
+        same.rate = rate
+    else:
+        session.add(Tariff(utility=utility, effective_from=effective_from, min_usage=min_usage, rate=rate))
+    session.flush()
+
+
+def remove_tier(session, tier):
+    """Delete a tier; the base tier can only go once it is the last of its version.
+
+    Raises ValueError otherwise. The caller commits.
+    """
+    if tier.min_usage == 0:
+        others = session.query(Tariff).filter(
+            Tariff.utility == tier.utility,
+            Tariff.effective_from == tier.effective_from,
+            Tariff.id != tier.id
+        ).count()
+        if others:
+            raise ValueError("Remove the higher tiers of this version before its base tier")
+    session.delete(tier)
+    session.flush()
+
+
+def compute_costs(utilities, dates, usage, tariffs, days=None):
+    """Vectorized cost for each (utility, date, usage) triple.
+
+    `days` is the number of days each usage covers (default 1); the tier is
+    picked from usage / days. Readings dated before a utility's first tariff,
+    or for a utility with no tariff at all, are priced at 0. Raises ValueError
+    for a version with no base tier (see validate_tariffs).
+    """
+    validate_tariffs(tariffs)
+    utilities = np.asarray(utilities, dtype=object)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    usage = np.asarray(usage, dtype=np.float64)
+    per_day = usage if days is None else usage / np.maximum(np.asarray(days, dtype=np.float64), 1)
+    rates = np.zeros(len(usage), dtype=np.float64)
+
+    for utility, u_tiers in tariffs.groupby('utility'):
+        mask = utilities == utility
+        if not mask.any():
+            continue
+
+        u_usage = per_day[mask]
+        u_rates = np.zeros(len(u_usage), dtype=np.float64)
+        versions = np.sort(u_tiers['effective_from'].unique()).astype('datetime64[D]')
+        version_idx = np.searchsorted(versions, dates[mask], side='right') - 1
+
+        for i, effective_from in enumerate(versions):
+            in_version = version_idx == i
+            if not in_version.any():
+                continue
+            tiers = u_tiers[u_tiers['effective_from'] == effective_from].sort_values('min_usage')
+            thresholds = tiers['min_usage'].to_numpy()
+            tier_rates = tiers['rate'].to_numpy()
+            # side='left' so usage exactly on a threshold stays in the lower tier.
+            # Only usage <= 0 lands at -1; thresholds[0] is 0 (validated), so that is the base tier.
+            tier_idx = np.searchsorted(thresholds, u_usage[in_version], side='left') - 1
+            u_rates[in_version] = tier_rates[np.maximum(tier_idx, 0)]
+
+        rates[mask] = u_rates
+
+    return np.round(usage * rates, 2)
+
+
+def daily_usage(meter_ids, values):
+    """Consumption deltas for readings already sorted by (meter_id, date).
+
+    The first reading of each meter and meter resets (negative deltas) give 0.
+    """
+    meter_ids = np.asarray(meter_ids)
+    values = np.asarray(values, dtype=np.float64)
+    usage = np.zeros(len(values), dtype=np.float64)
+    if len(values) > 1:
+        deltas = np.diff(values)
+        same_meter = meter_ids[1:] == meter_ids[:-1]
+        usage[1:] = np.where(same_meter, np.clip(deltas, 0, None), 0.0)
+    return usage
+
+
+def reading_gaps(meter_ids, dates):
+    """Days since the previous reading of the same meter (1 for a first reading)."""
+    meter_ids = np.asarray(meter_ids)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    gaps = np.ones(len(dates), dtype=np.int64)
+    if len(dates) > 1:
+        same_meter = meter_ids[1:] == meter_ids[:-1]
+        gaps[1:] = np.where(same_meter, np.diff(dates).astype(np.int64), 1)
+    return gaps
+
+
+def recompute_costs(meter_ids=None, start_date=None, session=None):
+    """Reprice stored readings from their consumption deltas in one bulk update.
+
+    Full meter histories are read so the first delta in range has its previous
+    reading, but only readings on/after `start_date` are rewritten.
+    Returns the number of readings updated.
+    """
+    own_session = session is None
+    if own_session:
+        session = Session()
+    try:
+        sql = (
+            "SELECT r.id, r.meter_id, r.date, r.value, m.type "
+            "FROM readings r JOIN meters m ON r.meter_id = m.id"
+        )
+        params = {}
+        if meter_ids is not None:
+            meter_ids = [int(m) for m in meter_ids]
+            if not meter_ids:
+                return 0
+            placeholders = ", ".join(f":m{i}" for i in range(len(meter_ids)))
+            sql += f" WHERE r.meter_id IN ({placeholders})"
+            params = {f"m{i}": m for i, m in enumerate(meter_ids)}
+        sql += " ORDER BY r.meter_id, r.date, r.id"
+
+        df = pd.read_sql(text(sql), session.connection(), params=params)
+        if df.empty:
+            return 0
+
+        dates = pd.to_datetime(df['date']).values.astype('datetime64[D]')
+        meter_col = df['meter_id'].to_numpy()
+        usage = daily_usage(meter_col, df['value'].to_numpy())
+        costs = compute_costs(df['type'].to_numpy(), dates, usage, load_tariffs(session),
+                              days=reading_gaps(meter_col, dates))
+
+        keep = np.ones(len(df), dtype=bool)
+        if start_date is not None:
+            keep = dates >= np.datetime64(pd.Timestamp(start_date).date(), 'D')
+
+        updates = [
+            {'id': int(r_id), 'cost': float(c)}
+            for r_id, c in zip(df['id'].to_numpy()[keep], costs[keep])
+        ]
+        if updates:
+            session.execute(text("UPDATE readings SET cost = :cost WHERE id = :id"), updates)
+        if own_session:
+            session.commit()
+        return len(updates)
+    except Exception:
+        if own_session:
+            session.rollback()
+        raise
+    finally:
+        if own_session:
+            session.close()
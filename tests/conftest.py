@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+import streamlit as st
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+import forecasting
+import models
+import series_store
+from models import Base, Mosque, Meter, Reading, seed_tariffs
+from tariffs import recompute_costs
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh on-disk SQLite database (with the default tariffs) behind every module."""
+    db_file = str(tmp_path / "test.db")
+    engine = create_engine(f"sqlite:///{db_file}", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+
+    original_engine = models.engine
+    monkeypatch.setattr(models, 'engine', engine)
+    monkeypatch.setattr(models, 'DB_FILE', db_file)
+    monkeypatch.setattr(forecasting, 'DB_FILE', db_file)
+    monkeypatch.setattr(series_store, 'engine', engine)
+    monkeypatch.setattr(series_store, '_store', None)
+    models.Session.configure(bind=engine)
+    cache.set_backend(cache.NullCache())
+    st.cache_data.clear()
+
+    session = models.Session()
+    seed_tariffs(session)
+    session.close()
+
+    yield engine
+
+    st.cache_data.clear()
+    cache.set_backend(None)
+    models.Session.configure(bind=original_engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def add_meter(db):
+    """Create a meter (and its mosque unless given) with (date, value) readings, priced from the tariffs."""
+    def add(meter_type='Electricity', readings=(), capacity=100, mosque_id=None):
+        session = models.Session()
+        if mosque_id is None:
+            mosque = Mosque(name=f"Mosque {capacity}", location="Test", capacity=capacity)
+            session.add(mosque)
+            session.flush()
+            mosque_id = mosque.id
+        meter = Meter(type=meter_type, mosque_id=mosque_id)
+        session.add(meter)
+        session.flush()
+        meter_id = meter.id
+        session.add_all([Reading(meter_id=meter_id, date=d, value=v, cost=0) for d, v in readings])
+        session.commit()
+        session.close()
+        recompute_costs([meter_id])
+        return mosque_id, meter_id
+    return add
@@ -0,0 +1,41 @@
+from datetime import date, timedelta
+
+import pytest
+
+
+def _readings(start, every, count, per_day):
+    return [(start + timedelta(days=i * every), 1000.0 + per_day * i * every) for i in range(count + 1)]
+
+
+def test_daily_and_weekly_meters_are_normalized_by_calendar_days(add_meter):
+    import utils
+
+    start = date(2026, 1, 1)
+    daily, _ = add_meter('Water', _readings(start, 1, 28, 10.0), capacity=100)
+    weekly, _ = add_meter('Water', _readings(start, 7, 4, 10.0), capacity=100)
+    heavy, _ = add_meter('Water', _readings(start, 7, 4, 20.0), capacity=100)
+
+    df = utils.get_fleet_benchmark().set_index('mosque_id')
+    assert df.loc[daily, 'consumption_per_capacity_day'] == pytest.approx(0.1)
+    assert df.loc[weekly, 'consumption_per_capacity_day'] == pytest.approx(0.1)
+    assert df.loc[heavy, 'consumption_per_capacity_day'] == pytest.approx(0.2)
+    assert df.loc[heavy, 'rank'] == 1
+    assert df.loc[daily, 'cost_per_capacity_day'] == pytest.approx(df.loc[weekly, 'cost_per_capacity_day'])
+
+    # From mid-range the weekly meter's span opens at its reading before start_date
+    df = utils.get_fleet_benchmark(start_date=start + timedelta(days=10)).set_index('mosque_id')
+    assert df.loc[daily, 'days'] == 19
+    assert df.loc[weekly, 'days'] == 21
+    assert df.loc[weekly, 'consumption_per_capacity_day'] == pytest.approx(0.1)
+
+
+def test_meters_of_one_mosque_add_up(add_meter):
+    import utils
+
+    start = date(2026, 1, 1)
+    mosque_id, _ = add_meter('Electricity', _readings(start, 1, 14, 30.0), capacity=50)
+    add_meter('Electricity', _readings(start, 7, 2, 20.0), mosque_id=mosque_id)
+
+    df = utils.get_fleet_benchmark(meter_type='Electricity')
+    assert len(df) == 1
+    assert df.loc[0, 'consumption_per_capacity_day'] == pytest.approx(1.0)
@@ -0,0 +1,75 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache
+from cache import DiskCache, dump_blob, load_blob
+
+
+def test_blob_round_trip():
+    df = pd.DataFrame({'ds': pd.to_datetime(['2026-01-01', '2026-01-02']), 'y': [1.5, 2.5]})
+    value = (df, np.float64(3.25), np.int64(7), None, 'ok', (pd.DataFrame(), True))
+
+    expires_at, out = load_blob(dump_blob(value, 123.0))
+
+    assert expires_at == 123.0
+    pd.testing.assert_frame_equal(out[0], df)
+    assert out[1:5] == (3.25, 7, None, 'ok')
+    assert isinstance(out[1], float) and isinstance(out[2], int)
+    assert out[5][0].empty and out[5][1] is True
+
+
+def test_blob_rejects_unknown_values():
+    with pytest.raises(TypeError):
+        dump_blob({'a': 1}, None)
+    with pytest.raises(ValueError):
+        load_blob(b'not a blob')
+
+
+def test_expired_entries_miss(tmp_path):
+    backend = DiskCache(str(tmp_path), default_ttl=60)
+    backend.set('fresh', 1)
+    backend.set('stale', 2, ttl=-1)
+
+    assert backend.get('fresh') == 1
+    assert backend.get('stale') is cache._MISS
+    assert not os.path.exists(backend._path('stale'))
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    backend = DiskCache(str(tmp_path), default_ttl=0)  # no expiry, so every blob has the same size
+    for i, key in enumerate(['a', 'b', 'c']):
+        backend.set(key, 'x' * 1000)
+        os.utime(backend._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    backend.get('a')  # refreshes 'a', leaving 'b' the oldest
+
+    backend.max_bytes = os.path.getsize(backend._path('a')) * 3
+    backend.set('d', 'x' * 1000)
+
+    assert backend.get('b') is cache._MISS
+    assert all(backend.get(key) == 'x' * 1000 for key in ['a', 'c', 'd'])
+
+
+def test_clear_on_one_replica_invalidates_the_others(tmp_path):
+    import utils
+
+    calls = []
+
+    @utils.query_cache
+    def answer(x):
+        calls.append(x)
+        return len(calls)
+
+    this, other = DiskCache(str(tmp_path)), DiskCache(str(tmp_path))
+    cache.set_backend(this)
+    try:
+        assert answer(1) == 1
+        assert answer(1) == 1
+        other.clear()
+        # Both the in-memory copy and the shared blob belong to the old generation
+        assert answer(1) == 2
+    finally:
+        cache.set_backend(None)
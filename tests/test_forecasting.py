@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import models
+from forecasting import _partition, fit_trend, forecast_fleet
+from models import Forecast
+
+
+def _series(n=60, start=date(2026, 1, 1), slope=2.0):
+    readings, value = [], 1000.0
+    for i in range(n):
+        value += 100.0 + slope * i + (i % 7)
+        readings.append((start + timedelta(days=i), value))
+    return readings
+
+
+def test_partition_is_round_robin_and_drops_empty_chunks():
+    assert _partition([1, 2, 3, 4, 5], 2) == [[1, 3, 5], [2, 4]]
+    assert _partition([1, 2], 4) == [[1], [2]]
+
+
+def test_fit_trend_projects_a_linear_series():
+    days = np.arange(10, 40)
+    future, preds, accuracy = fit_trend(days, 3.0 * days + 5.0, horizon=5)
+    assert future.tolist() == [40, 41, 42, 43, 44]
+    np.testing.assert_allclose(preds, 3.0 * future + 5.0)
+    assert accuracy == 1.0
+
+
+def test_fleet_forecast_matches_predict_usage(add_meter):
+    import utils
+
+    _, first = add_meter('Electricity', _series(slope=2.0))
+    _, second = add_meter('Water', _series(slope=-0.5))
+
+    assert forecast_fleet(max_workers=2) == 60
+
+    for meter_id in (first, second):
+        expected, avg, _ = utils.predict_usage(meter_id)
+        expected = expected[expected['type'] == 'Predicted']
+        fleet = utils.get_fleet_forecast()
+        fleet = fleet[fleet['meter_id'] == meter_id].sort_values('ds')
+        assert pd.to_datetime(fleet['ds']).tolist() == expected['ds'].tolist()
+        np.testing.assert_allclose(fleet['y'].to_numpy(), expected['y'].to_numpy())
+
+
+def test_deleted_mosques_and_meters_are_not_forecast(add_meter):
+    import utils
+
+    mosque_id, _ = add_meter('Electricity', _series())
+    _, kept = add_meter('Electricity', _series())
+    _, dropped_meter = add_meter('Water', _series())
+    forecast_fleet(max_workers=1)
+
+    utils.delete_mosque(mosque_id)
+    utils.delete_meter(dropped_meter)
+    session = models.Session()
+    assert {m for (m,) in session.query(Forecast.meter_id).distinct()} == {kept}
+    session.close()
+
+    assert forecast_fleet(max_workers=1) == 30
+    assert set(utils.get_fleet_forecast()['meter_id']) == {kept}
@@ -0,0 +1,67 @@
+import io
+from datetime import date
+
+from sqlalchemy import text
+
+import models
+from models import Reading, ensure_reading_index
+
+
+def _readings(meter_id):
+    session = models.Session()
+    rows = session.query(Reading.date, Reading.value, Reading.cost).filter_by(
+        meter_id=meter_id).order_by(Reading.date).all()
+    session.close()
+    return rows
+
+
+def _csv(meter_id, readings):
+    lines = ["meter_id,date,value"] + [f"{meter_id},{d.isoformat()},{v}" for d, v in readings]
+    return io.StringIO("\n".join(lines))
+
+
+def test_reimporting_the_same_csv_changes_nothing(add_meter):
+    import utils
+
+    _, meter_id = add_meter('Electricity')
+    readings = [(date(2026, 3, d), 1000.0 + 100 * d) for d in range(1, 11)]
+
+    ok, message = utils.process_csv_upload(_csv(meter_id, readings))
+    assert ok and message.endswith("(10 new or updated)")
+    before = _readings(meter_id)
+
+    ok, message = utils.process_csv_upload(_csv(meter_id, readings))
+    assert ok and message.endswith("(0 new or updated)")
+    assert _readings(meter_id) == before
+
+
+def test_overwriting_a_reading_reprices_the_next_one(add_meter):
+    import utils
+
+    _, meter_id = add_meter('Electricity', [
+        (date(2026, 3, 1), 1000.0), (date(2026, 3, 2), 1100.0), (date(2026, 3, 3), 1200.0)
+    ])
+    utils.add_reading(meter_id, date(2026, 3, 2), 1050.0)
+
+    rows = _readings(meter_id)
+    assert len(rows) == 3
+    assert [r.value for r in rows] == [1000.0, 1050.0, 1200.0]
+    # 50 then 150 units at the 0.18 base rate
+    assert [r.cost for r in rows] == [0.0, 9.0, 27.0]
+
+
+def test_dedupe_keeps_latest_row_and_reprices(db, add_meter):
+    _, meter_id = add_meter('Electricity', [
+        (date(2026, 3, 1), 1000.0), (date(2026, 3, 2), 1100.0), (date(2026, 3, 3), 1200.0)
+    ])
+    with db.begin() as conn:
+        conn.execute(text("DROP INDEX ux_readings_meter_date"))
+        conn.execute(text(
+            "INSERT INTO readings (meter_id, date, value, cost) VALUES (:m, '2026-03-02', 1150.0, 0)"
+        ), {'m': meter_id})
+
+    ensure_reading_index()
+
+    rows = _readings(meter_id)
+    assert [r.value for r in rows] == [1000.0, 1150.0, 1200.0]
+    assert [r.cost for r in rows] == [0.0, 27.0, 9.0]
@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache
+import series_store
+from series_store import MeterSeries, SeriesStore
+
+
+def _days(*days):
+    return np.array(days, dtype=np.int32)
+
+
+def _held(series):
+    n = series.size
+    return series.day[:n].tolist(), series.value[:n].tolist(), series.cost[:n].tolist()
+
+
+def test_upsert_appends_newer_days():
+    series = MeterSeries(1, 'Water', capacity=2)
+    series.upsert(_days(1, 2), np.array([10.0, 20.0]), np.array([0.0, 1.0], dtype=np.float32))
+    series.upsert(_days(3, 4, 5), np.array([30.0, 40.0, 50.0]), np.array([1.0, 1.0, 1.0], dtype=np.float32))
+
+    assert _held(series) == ([1, 2, 3, 4, 5], [10.0, 20.0, 30.0, 40.0, 50.0], [0.0, 1.0, 1.0, 1.0, 1.0])
+    assert len(series.day) >= 5
+
+
+def test_upsert_merges_and_overwrites_existing_days():
+    series = MeterSeries(1, 'Water')
+    series.upsert(_days(1, 3, 5), np.array([10.0, 30.0, 50.0]), np.array([0.0, 2.0, 2.0], dtype=np.float32))
+    series.upsert(_days(2, 3), np.array([20.0, 35.0]), np.array([1.0, 1.5], dtype=np.float32))
+
+    assert _held(series) == ([1, 2, 3, 5], [10.0, 20.0, 35.0, 50.0], [0.0, 1.0, 1.5, 2.0])
+    assert series.window(2, 4) == (1, 3)
+
+
+def _seed(add_meter):
+    start = date(2026, 1, 1)
+    first, _ = add_meter('Electricity', [(start + timedelta(days=i), 1000.0 + 611.37 * i) for i in range(40)])
+    add_meter('Water', [(start + timedelta(days=i), 50.0 + 3.3 * i) for i in range(40)], mosque_id=first)
+    # A meter reset, which both paths clip to 0
+    add_meter('Water', [(start, 500.0), (start + timedelta(days=1), 520.0), (start + timedelta(days=2), 5.0)])
+    return first, start
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'meter_type': 'Water'},
+    {'mosque_id': 'first', 'start_date': date(2026, 1, 10), 'end_date': date(2026, 1, 20)},
+])
+def test_frame_matches_query_chart_data(add_meter, filters):
+    import utils
+
+    first, _ = _seed(add_meter)
+    filters = {k: (first if v == 'first' else v) for k, v in filters.items()}
+    store = SeriesStore()
+    store.load()
+
+    def ordered(df):
+        return df.sort_values(['meter_id', 'date']).reset_index(drop=True)
+
+    expected = ordered(utils.query_chart_data(**filters))
+    got = ordered(store.frame(**filters))
+    pd.testing.assert_frame_equal(got[expected.columns], expected)
+
+
+def test_store_reloads_when_the_generation_moves(add_meter, tmp_path, monkeypatch):
+    import models
+    from models import Reading
+
+    monkeypatch.setenv(series_store.SERIES_STORE_ENV, '1')
+    _, start = _seed(add_meter)
+    cache.set_backend(cache.DiskCache(str(tmp_path)))
+
+    store = series_store.get_store()
+    rows = len(store.frame())
+
+    # Another replica writes a reading and clears the shared cache
+    session = models.Session()
+    meter_id = session.query(Reading.meter_id).first()[0]
+    session.add(Reading(meter_id=meter_id, date=start + timedelta(days=100), value=99999.0, cost=0))
+    session.commit()
+    session.close()
+    cache.DiskCache(str(tmp_path)).clear()
+
+    assert len(series_store.get_store().frame()) == rows + 1
@@ -0,0 +1,95 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Base, DEFAULT_TARIFFS, Tariff, seed_tariffs
+from tariffs import add_tier, compute_costs, load_tariffs, remove_tier, tariffs_frame
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    seed_tariffs(session)
+    yield session
+    session.close()
+
+
+def test_new_version_copies_forward_tiers_in_force(session):
+    add_tier(session, 'Electricity', date(2026, 1, 1), 6000.0, 0.40)
+    session.commit()
+
+    costs = compute_costs(
+        ['Electricity'] * 4,
+        [date(2026, 6, 1), date(2026, 6, 1), date(2025, 6, 1), date(2025, 6, 1)],
+        [100.0, 7000.0, 100.0, 7000.0],
+        load_tariffs(session)
+    )
+    assert costs.tolist() == [18.0, 2800.0, 18.0, 2100.0]
+
+
+def test_existing_tier_is_updated_not_duplicated(session):
+    add_tier(session, 'Water', date(2000, 1, 1), 0.0, 7.0)
+    session.commit()
+
+    water = session.query(Tariff).filter_by(utility='Water').all()
+    assert [(t.min_usage, t.rate) for t in water] == [(0.0, 7.0)]
+
+
+def test_first_version_must_have_base_tier(session):
+    with pytest.raises(ValueError):
+        add_tier(session, 'Gas', date(2026, 1, 1), 100.0, 1.0)
+
+
+def test_base_tier_cannot_be_removed_while_higher_tiers_remain(session):
+    base = session.query(Tariff).filter_by(utility='Electricity', min_usage=0.0).one()
+    with pytest.raises(ValueError):
+        remove_tier(session, base)
+
+
+def test_version_without_base_tier_is_rejected():
+    tariffs = tariffs_frame(DEFAULT_TARIFFS + [('Electricity', date(2026, 1, 1), 6000.0, 0.40)])
+    with pytest.raises(ValueError):
+        compute_costs(['Electricity'], [date(2026, 6, 1)], [100.0], tariffs)
+
+
+def test_usage_on_threshold_stays_in_lower_tier():
+    tariffs = tariffs_frame(DEFAULT_TARIFFS)
+    costs = compute_costs(['Electricity'] * 3, [date(2026, 6, 1)] * 3, [0.0, 6000.0, 6001.0], tariffs)
+    assert costs.tolist() == [0.0, 1080.0, 1800.3]
+
+
+def test_multi_day_gap_is_tiered_on_average_daily_usage(add_meter):
+    import models
+    from models import Reading
+
+    _, meter_id = add_meter('Electricity', [(date(2026, 1, 1), 0.0), (date(2026, 1, 31), 9000.0)])
+
+    s = models.Session()
+    costs = [c for (c,) in s.query(Reading.cost).filter_by(meter_id=meter_id).order_by(Reading.date)]
+    s.close()
+    # 9000 units over 30 days is 300/day: base tier, whole delta at 0.18
+    assert costs == [0.0, 1620.0]
+
+
+def test_recompute_leaves_seeded_costs_unchanged(db):
+    import models
+    from models import Reading, seed_data
+    from tariffs import recompute_costs
+
+    seed_data()
+    s = models.Session()
+    seeded = s.query(Reading.id, Reading.cost).order_by(Reading.id).all()
+    s.close()
+
+    recompute_costs()
+    s = models.Session()
+    assert s.query(Reading.id, Reading.cost).order_by(Reading.id).all() == seeded
+    s.close()
@@ -1,9 +1,14 @@
 import pandas as pd
-import numpy as np
 from sqlalchemy.orm import Session as DBSession
-from models import Session, Mosque, Meter, Reading, User
-from sklearn.linear_model import LinearRegression
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import Session, Mosque, Meter, Reading, User, Forecast, Tariff
+from forecasting import fit_trend, forecast_fleet
+from tariffs import recompute_costs, add_tier, remove_tier
+from cache import shared_cache, clear_shared_cache, cache_generation
+from series_store import get_store
 from datetime import datetime, timedelta
+import functools
 import hashlib
 import streamlit as st
 
@@ -25,21 +30,53 @@ def login_user(username, password):
 def get_db_session():
     return Session()
 
-@st.cache_data
+def refresh_series_store(meter_ids=None, start_date=None):
+    # Keep the optional in-memory store in step with writes (no-op when disabled)
+    store = get_store()
+    if store is not None:
+        store.load(meter_ids=meter_ids, start_date=start_date)
+
+def clear_caches():
+    # Data changed: drop this process's results and move the shared generation on,
+    # which makes other replicas' in-memory entries (keyed on it) unreachable too
+    st.cache_data.clear()
+    clear_shared_cache()
+
+def generation_cache(func):
+    # st.cache_data keyed on the shared generation, passed in as an argument so that
+    # a write on any replica also invalidates this process's copy. For results
+    # that can't go in the shared cache (e.g. ORM objects).
+    @functools.wraps(func)
+    def with_generation(*args, generation=None, **kwargs):
+        return func(*args, **kwargs)
+
+    memory = st.cache_data(with_generation)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return memory(*args, generation=cache_generation(), **kwargs)
+
+    return wrapper
+
+def query_cache(func):
+    # Per-process cache in front of the shared cache
+    return generation_cache(shared_cache()(func))
+
+@generation_cache
 def get_mosques():
     session = get_db_session()
     mosques = session.query(Mosque).all()
     session.close()
     return mosques
 
-@st.cache_data
+@generation_cache
 def get_meters(mosque_id):
     session = get_db_session()
     meters = session.query(Meter).filter_by(mosque_id=mosque_id).all()
     session.close()
     return meters
 
-@st.cache_data
+@query_cache
 def get_consumption_stats(mosque_id=None):
     session = get_db_session()
     query = session.query(Reading).join(Meter).join(Mosque)
@@ -59,15 +96,23 @@ def get_consumption_stats(mosque_id=None):
     df = df.sort_values('date')
     # Calculate daily consumption (diff)
     # Group by meter to ensure diff is correct
-    df['daily_consumption'] = df.groupby('meter_id')['value'].diff().fillna(0)
+    df['daily_consumption'] = df.groupby('meter_id')['value'].diff().fillna(0).clip(lower=0)
     
     total_cons = df['daily_consumption'].sum()
     total_cost = df['cost'].sum()
     
     return total_cons, total_cost, df
 
-@st.cache_data
 def get_chart_data(mosque_id=None, meter_type=None, start_date=None, end_date=None):
+    # The in-memory store is per process (it reloads when the shared generation moves),
+    # so its slices are served directly and never written into the shared cache
+    store = get_store()
+    if store is not None:
+        return store.frame(mosque_id, meter_type, start_date, end_date)
+    return query_chart_data(mosque_id, meter_type, start_date, end_date)
+
+@query_cache
+def query_chart_data(mosque_id=None, meter_type=None, start_date=None, end_date=None):
     session = get_db_session()
     # Explicitly select Reading and joined columns
     query = session.query(
@@ -95,15 +140,87 @@ def get_chart_data(mosque_id=None, meter_type=None, start_date=None, end_date=No
         return pd.DataFrame()
         
     df['date'] = pd.to_datetime(df['date'])
-    df['daily_consumption'] = df.groupby('meter_id')['value'].diff().fillna(0)
+    # Meter resets (negative deltas) count as 0, the same rule as pricing and the fleet benchmark
+    df['daily_consumption'] = df.groupby('meter_id')['value'].diff().fillna(0).clip(lower=0)
     # Fix: First reading of a period shouldn't be 0 if we filter, 
     # but for this POC diff is okay. In real app, we need prev reading outside range.
     
     return df
 
-from sklearn.metrics import r2_score
+FLEET_BENCHMARK_SQL = """
+WITH bounds AS (
+    SELECT mt.id AS meter_id,
+           (SELECT MAX(p.date) FROM readings p
+            WHERE p.meter_id = mt.id AND p.date < :start_date) AS prev_date
+    FROM meters mt
+),
+deltas AS (
+    SELECT r.meter_id, r.date, r.cost,
+           r.value - LAG(r.value) OVER (PARTITION BY r.meter_id ORDER BY r.date) AS usage
+    FROM bounds b
+    CROSS JOIN readings r -- CROSS JOIN keeps meters as the outer loop: one index range per meter
+    WHERE r.meter_id = b.meter_id
+      AND r.date >= COALESCE(b.prev_date, :start_date, '')
+      AND r.date <= COALESCE(:end_date, '9999-12-31')
+),
+per_meter AS (
+    -- The row before the range (or the first reading at all) has no delta but
+    -- still opens the span, so days is the calendar time the deltas cover
+    SELECT d.meter_id,
+           SUM(MAX(d.usage, 0)) AS consumption,
+           SUM(CASE WHEN d.usage IS NOT NULL THEN d.cost END) AS cost,
+           julianday(MAX(d.date)) - julianday(MIN(d.date)) AS days
+    FROM deltas d
+    GROUP BY d.meter_id
+),
+per_mosque AS (
+    -- Meters can cover different spans, so daily rates are taken per meter and summed
+    SELECT mo.id AS mosque_id, mo.name AS name, mo.capacity AS capacity, mt.type AS type,
+           SUM(pm.consumption) AS consumption,
+           SUM(pm.cost) AS cost,
+           MAX(pm.days) AS days,
+           SUM(pm.consumption / pm.days) AS consumption_per_day,
+           SUM(pm.cost / pm.days) AS cost_per_day
+    FROM per_meter pm
+    JOIN meters mt ON mt.id = pm.meter_id
+    JOIN mosques mo ON mo.id = mt.mosque_id
+    WHERE pm.days > 0
+      AND (:meter_type IS NULL OR mt.type = :meter_type)
+      AND mo.capacity > 0
+    GROUP BY mo.id, mt.type
+),
+normalized AS (
+    SELECT *,
+           consumption_per_day / capacity AS consumption_per_capacity_day,
+           cost_per_day / capacity AS cost_per_capacity_day
+    FROM per_mosque
+)
+SELECT *,
+       RANK() OVER (PARTITION BY type ORDER BY consumption_per_capacity_day DESC) AS rank,
+       PERCENT_RANK() OVER (PARTITION BY type ORDER BY consumption_per_capacity_day) AS percentile
+FROM normalized
+ORDER BY type, rank
+"""
 
-@st.cache_data
+@query_cache
+def get_fleet_benchmark(start_date=None, end_date=None, meter_type=None):
+    # One round trip: deltas (LAG), per-meter daily rates over the calendar span the
+    # readings cover (so weekly and daily recorders compare fairly), per-mosque sums
+    # normalized by capacity, then rank/percentile within each utility, all inside SQLite.
+    # Each meter's scan starts at its last reading before start_date (an index seek
+    # on (meter_id, date)), so the first day in range still has its previous reading
+    # without sorting the whole history. Meter resets count as 0, as in the KPIs.
+    params = {
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None,
+        'meter_type': meter_type
+    }
+    session = get_db_session()
+    df = pd.read_sql(text(FLEET_BENCHMARK_SQL), session.connection(), params=params)
+    session.close()
+    return df
+
+@query_cache
 def predict_usage(meter_id):
     session = get_db_session()
     # Fetch data
@@ -120,24 +237,10 @@ def predict_usage(meter_id):
     df['usage'] = df['y'].diff().fillna(0)
     df = df[1:] # Drop first NaN
     
-    # Train
+    # Train + Predict (shared with the fleet runner in forecasting.py)
     df['date_ordinal'] = df['ds'].map(pd.Timestamp.toordinal)
-    X = df[['date_ordinal']]
-    y = df['usage']
-    
-    model = LinearRegression()
-    model.fit(X, y)
-    
-    # Calculate Accuracy
-    y_pred_train = model.predict(X)
-    accuracy = r2_score(y, y_pred_train)
-    
-    # Predict
-    last_date = df['ds'].max()
-    future_dates = [last_date + timedelta(days=x) for x in range(1, 31)]
-    future_ordinals = np.array([d.toordinal() for d in future_dates]).reshape(-1, 1)
-    
-    preds = model.predict(future_ordinals)
+    future_ordinals, preds, accuracy = fit_trend(df['date_ordinal'].values, df['usage'].values)
+    future_dates = [pd.Timestamp.fromordinal(int(o)) for o in future_ordinals]
     
     future_df = pd.DataFrame({
         'ds': future_dates,
@@ -152,27 +255,65 @@ def predict_usage(meter_id):
     
     return result, preds.mean(), accuracy
 
-def add_reading(meter_id, date_obj, value, cost=0):
+def run_fleet_forecast(max_workers=None):
+    count = forecast_fleet(max_workers=max_workers)
+    clear_caches()
+    return count
+
+@query_cache
+def get_fleet_forecast():
+    session = get_db_session()
+    query = session.query(
+        Forecast.date.label('ds'),
+        Forecast.value.label('y'),
+        Forecast.meter_id.label('meter_id'),
+        Meter.mosque_id.label('mosque_id'),
+        Meter.type.label('type')
+    ).join(Meter, Forecast.meter_id == Meter.id).join(Mosque, Meter.mosque_id == Mosque.id)
+    df = pd.read_sql(query.statement, session.bind)
+    session.close()
+    return df
+
+def upsert_readings(rows, session, update_cost=True):
+    """Insert readings, or update the existing row for the same (meter_id, date).
+
+    `rows` are dicts with meter_id, date, value and cost. Rows whose stored
+    values already match are left untouched, so re-importing the same data
+    is a no-op. Returns the number of rows inserted or changed.
+    """
+    if not rows:
+        return 0
+    table = Reading.__table__
+    stmt = sqlite_insert(table)
+    set_ = {'value': stmt.excluded.value}
+    changed = table.c.value.is_distinct_from(stmt.excluded.value)
+    if update_cost:
+        set_['cost'] = stmt.excluded.cost
+        changed = changed | table.c.cost.is_distinct_from(stmt.excluded.cost)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['meter_id', 'date'],
+        set_=set_,
+        where=changed
+    )
+    return session.execute(stmt, rows).rowcount
+
+def add_reading(meter_id, date_obj, value, cost=None):
     session = get_db_session()
-    # Check if reading exists for this date? (Optional, skipping for simple POC)
-    
-    # Simple logic: If value provided is total reading, we just add it.
-    # If it's consumption, we might need to handle differently. 
     # The models rely on 'value' being the cumulative meter reading.
-    
-    reading = Reading(
-        meter_id=meter_id,
-        date=date_obj,
-        value=value,
-        cost=cost
+    # Re-entering a date overwrites that day's reading instead of adding a second one.
+    upsert_readings(
+        [{'meter_id': meter_id, 'date': date_obj, 'value': value, 'cost': cost or 0}],
+        session,
+        update_cost=cost is not None
     )
-    session.add(reading)
-    session.commit()
-    session.close()
-    session.add(reading)
     session.commit()
     session.close()
-    st.cache_data.clear()
+    # The next reading's delta (and so its cost) changes with this value, so always
+    # reprice from the following day; this day too unless the caller fixed its cost
+    reprice_from = date_obj if cost is None else date_obj + timedelta(days=1)
+    recompute_costs([meter_id], start_date=reprice_from)
+    refresh_series_store([meter_id], start_date=date_obj)
+    clear_caches()
     return True
 
 def create_mosque(name, location, capacity):
@@ -181,17 +322,22 @@ def create_mosque(name, location, capacity):
     session.add(mosque)
     session.commit()
     session.close()
-    st.cache_data.clear()
+    clear_caches()
     return True
 
 def delete_mosque(mosque_id):
     session = get_db_session()
     # meters will be deleted by cascade if we configured it, but let's be manual for safety in POC
     # simplified for POC
+    meter_ids = session.query(Meter.id).filter(Meter.mosque_id == mosque_id)
+    session.query(Forecast).filter(Forecast.meter_id.in_(meter_ids.scalar_subquery())).delete(synchronize_session=False)
     session.query(Mosque).filter(Mosque.id == mosque_id).delete()
     session.commit()
     session.close()
-    st.cache_data.clear()
+    store = get_store()
+    if store is not None:
+        store.drop(mosque_id=mosque_id)
+    clear_caches()
     return True
 
 def create_meter(mosque_id, type):
@@ -200,17 +346,87 @@ def create_meter(mosque_id, type):
     session.add(meter)
     session.commit()
     session.close()
-    st.cache_data.clear()
+    clear_caches()
     return True
 
 def delete_meter(meter_id):
     session = get_db_session()
+    session.query(Forecast).filter(Forecast.meter_id == meter_id).delete(synchronize_session=False)
     session.query(Meter).filter(Meter.id == meter_id).delete()
     session.commit()
     session.close()
-    st.cache_data.clear()
+    store = get_store()
+    if store is not None:
+        store.drop(meter_ids=[meter_id])
+    clear_caches()
     return True
 
+@generation_cache
+def get_tariffs():
+    session = get_db_session()
+    query = session.query(Tariff).order_by(Tariff.utility, Tariff.effective_from, Tariff.min_usage)
+    df = pd.read_sql(query.statement, session.bind)
+    session.close()
+    return df
+
+def get_unit_rate(utility, date_obj=None):
+    # Base-tier rate in effect on date_obj, for display on the entry form
+    df = get_tariffs()
+    df = df[df['utility'] == utility]
+    if date_obj is not None:
+        df = df[pd.to_datetime(df['effective_from']) <= pd.Timestamp(date_obj)]
+    if df.empty:
+        return 0.0
+    current = df[df['effective_from'] == df['effective_from'].max()]
+    return float(current.sort_values('min_usage')['rate'].iloc[0])
+
+def add_tariff(utility, effective_from, min_usage, rate, recompute=True):
+    session = get_db_session()
+    try:
+        add_tier(session, utility, effective_from, min_usage, rate)
+    except ValueError:
+        session.rollback()
+        session.close()
+        return False
+    session.commit()
+    if recompute:
+        meter_ids = [m_id for (m_id,) in session.query(Meter.id).filter(Meter.type == utility)]
+        recompute_costs(meter_ids, start_date=effective_from, session=session)
+        session.commit()
+        refresh_series_store(meter_ids, start_date=effective_from)
+    session.close()
+    clear_caches()
+    return True
+
+def delete_tariff(tariff_id, recompute=True):
+    session = get_db_session()
+    tariff = session.get(Tariff, tariff_id)
+    if tariff is None:
+        session.close()
+        return False
+    utility, effective_from = tariff.utility, tariff.effective_from
+    try:
+        remove_tier(session, tariff)
+    except ValueError:
+        session.rollback()
+        session.close()
+        return False
+    session.commit()
+    if recompute:
+        meter_ids = [m_id for (m_id,) in session.query(Meter.id).filter(Meter.type == utility)]
+        recompute_costs(meter_ids, start_date=effective_from, session=session)
+        session.commit()
+        refresh_series_store(meter_ids, start_date=effective_from)
+    session.close()
+    clear_caches()
+    return True
+
+def recompute_all_costs():
+    count = recompute_costs()
+    refresh_series_store()
+    clear_caches()
+    return count
+
 def create_user(username, password, role):
     session = get_db_session()
     # check if exists
@@ -233,21 +449,30 @@ def process_csv_upload(file):
         if not required.issubset(df.columns):
             return False, "Missing columns: meter_id, date, value"
         
-        objects = []
-        for _, row in df.iterrows():
-            meter_id = int(row['meter_id'])
-            date_obj = pd.to_datetime(row['date']).date()
-            val = float(row['value'])
-            cost = float(row.get('cost', 0))
-            
-            objects.append(Reading(meter_id=meter_id, date=date_obj, value=val, cost=cost))
-            
-        session.add_all(objects)
+        # Any 'cost' column in the file is ignored; costs come from the tariff table
+        df = df.assign(
+            meter_id=df['meter_id'].astype(int),
+            date=pd.to_datetime(df['date']).dt.date,
+            value=df['value'].astype(float),
+            cost=0.0
+        )
+        rows = df[['meter_id', 'date', 'value', 'cost']].to_dict('records')
+        
+        # Upsert on (meter_id, date): overlapping re-imports update instead of duplicating
+        changed = upsert_readings(rows, session, update_cost=False)
+        if changed:
+            recompute_costs(
+                df['meter_id'].unique().tolist(),
+                start_date=df['date'].min(),
+                session=session
+            )
         session.commit()
-        count = len(objects)
+        if changed:
+            refresh_series_store(df['meter_id'].unique().tolist(), start_date=df['date'].min())
+        count = len(rows)
         session.close()
-        st.cache_data.clear()
-        return True, f"Successfully added {count} readings"
+        clear_caches()
+        return True, f"Successfully processed {count} readings ({changed} new or updated)"
     except Exception as e:
         session.close()
         return False, str(e)